@@ -9,118 +9,156 @@ bl_info = {
 }
 
 import bpy
+import re
+from collections import namedtuple
 from bpy.props import BoolProperty, EnumProperty, IntProperty, FloatProperty
 
 
 # -----------------------------
 # Utilities: traversal helpers
 # -----------------------------
+# Image node name heuristics (MainTex/BaseColor/Albedo/... and alpha masks)
+_BASECOLOR_RE = re.compile(r"main|base|albedo|color|diffuse", re.I)
+_ALPHA_RE = re.compile(r"alpha|opacity|transparent", re.I)
+
 def _is_image_node(n):
     return n and n.type == 'TEX_IMAGE' and getattr(n, "image", None) is not None
 
 def _is_normalmap_node(n):
     return n and n.type == 'NORMAL_MAP'
 
-def _iter_links_to_socket(tree, to_socket):
+def _build_link_index(tree):
+    """
+    Map each linked input socket (by pointer) to the nodes feeding it.
+    socket.links scans every link of the tree on each access, so build this once per tree.
+    """
+    link_index = {}
     for lk in tree.links:
-        if lk.to_socket == to_socket:
-            yield lk
+        link_index.setdefault(lk.to_socket.as_pointer(), []).append(lk.from_node)
+    return link_index
 
-def _find_upstream_image_from_socket(sock, max_depth=12, visited=None):
-    """Trace upstream links to find the first TEX_IMAGE node."""
-    if visited is None:
-        visited = set()
+def _find_upstream_image_from_socket(sock, link_index, max_depth=12):
+    """Trace upstream links to find the first TEX_IMAGE node (iterative DFS)."""
     if sock is None:
         return None
-    if sock in visited:
-        return None
-    visited.add(sock)
+    visited = set()
+    stack = [(sock, max_depth)]
+
+    while stack:
+        sock, depth = stack.pop()
+        # Plain int pointers hash cheaply, unlike bpy socket wrappers.
+        ptr = sock.as_pointer()
+        if ptr in visited:
+            continue
+        visited.add(ptr)
 
-    if not sock.is_linked:
-        return None
+        from_nodes = link_index.get(ptr)
+        if not from_nodes:
+            continue
 
-    for link in sock.links:
-        n = link.from_node
-        if _is_image_node(n):
-            return n
-        # go deeper through common nodes
-        if max_depth > 0:
-            # Try to trace from a reasonable input socket of that node
-            # We prefer the first linked input socket.
-            for inp in getattr(n, "inputs", []):
-                if inp.is_linked:
-                    found = _find_upstream_image_from_socket(inp, max_depth - 1, visited)
-                    if found:
-                        return found
+        for n in from_nodes:
+            if _is_image_node(n):
+                return n
+            # go deeper through common nodes
+            if depth > 0:
+                # Push linked inputs reversed so the first linked input is explored first.
+                linked = [inp for inp in n.inputs if inp.as_pointer() in link_index]
+                stack.extend((inp, depth - 1) for inp in reversed(linked))
     return None
 
-def _find_upstream_normal_image(tree):
+def _find_upstream_normal_image(tree, classified=None, link_index=None):
     """Find image texture used for normal map by looking for NORMAL_MAP node inputs."""
-    for n in tree.nodes:
-        if _is_normalmap_node(n):
-            # Normal Map node commonly takes Color input from image
-            col_in = n.inputs.get("Color")
-            img = _find_upstream_image_from_socket(col_in)
-            if img:
-                return img, n
+    normal_maps = classified.normal_maps if classified is not None else [n for n in tree.nodes if _is_normalmap_node(n)]
+    if not normal_maps:
+        return None, None
+    if link_index is None:
+        link_index = _build_link_index(tree)
+    for n in normal_maps:
+        # Normal Map node commonly takes Color input from image
+        col_in = n.inputs.get("Color")
+        img = _find_upstream_image_from_socket(col_in, link_index)
+        if img:
+            return img, n
     # Sometimes image connects directly into shader normal via Bump etc.
     # We keep it simple: no further heuristics for now.
     return None, None
 
-def _find_principled_node(tree):
-    for n in tree.nodes:
-        if n.type == 'BSDF_PRINCIPLED':
-            return n
-    return None
+# Shader nodes whose Color/Base Color input may carry the base texture
+SHADER_COLOR_TYPES = frozenset({'BSDF_DIFFUSE', 'BSDF_PRINCIPLED', 'EMISSION', 'BSDF_GLOSSY', 'BSDF_TOON'})
 
-def _find_material_output(tree):
-    for n in tree.nodes:
-        if n.type == 'OUTPUT_MATERIAL':
-            return n
-    return None
+# Result of a single walk over tree.nodes, shared by the guessers below.
+_ClassifiedTree = namedtuple(
+    "_ClassifiedTree",
+    ("principled", "color_shaders", "image_nodes", "named_image", "alpha_image", "normal_maps"),
+)
+
+def _classify_tree(tree):
+    """Bucket the nodes the guessers care about in one pass over tree.nodes."""
+    principled = None
+    color_shaders = []
+    image_nodes = []
+    named_image = None
+    alpha_image = None
+    normal_maps = []
 
-def _guess_basecolor_image_node(mat):
+    for n in tree.nodes:
+        # n.type goes through RNA on every access, so read it once per node
+        t = n.type
+        if t == 'TEX_IMAGE':
+            if n.image is None:
+                continue
+            image_nodes.append(n)
+            nm = n.name or ""
+            if named_image is None and _BASECOLOR_RE.search(nm):
+                named_image = n
+            if alpha_image is None and _ALPHA_RE.search(nm):
+                alpha_image = n
+        elif t in SHADER_COLOR_TYPES:
+            color_shaders.append(n)
+            if principled is None and t == 'BSDF_PRINCIPLED':
+                principled = n
+        elif t == 'NORMAL_MAP':
+            normal_maps.append(n)
+
+    return _ClassifiedTree(principled, color_shaders, image_nodes, named_image, alpha_image, normal_maps)
+
+def _guess_basecolor_image_node(mat, classified=None, link_index=None):
     """Try to guess the base color image texture used in this material."""
     if not mat.use_nodes or not mat.node_tree:
         return None
     tree = mat.node_tree
+    if classified is None:
+        classified = _classify_tree(tree)
+    if link_index is None:
+        link_index = _build_link_index(tree)
 
     # 1) Prefer image feeding into Principled Base Color if exists
-    principled = _find_principled_node(tree)
+    principled = classified.principled
     if principled:
         base_in = principled.inputs.get("Base Color")
-        img = _find_upstream_image_from_socket(base_in)
+        img = _find_upstream_image_from_socket(base_in, link_index)
         if img:
             return img
 
     # 2) Prefer image feeding into any shader color (Emission/BSDF etc.)
-    for n in tree.nodes:
-        if n.type in {'BSDF_DIFFUSE', 'BSDF_PRINCIPLED', 'EMISSION', 'BSDF_GLOSSY', 'BSDF_TOON'}:
-            for key in ("Color", "Base Color"):
-                s = n.inputs.get(key)
-                img = _find_upstream_image_from_socket(s)
-                if img:
-                    return img
+    for n in classified.color_shaders:
+        for key in ("Color", "Base Color"):
+            s = n.inputs.get(key)
+            img = _find_upstream_image_from_socket(s, link_index)
+            if img:
+                return img
 
     # 3) Name heuristics: MainTex/BaseColor/Albedo/Color
-    candidates = []
-    keys = ("main", "base", "albedo", "color", "maintx", "maintex", "diffuse")
-    for n in tree.nodes:
-        if _is_image_node(n):
-            nm = (n.name or "").lower()
-            if any(k in nm for k in keys):
-                candidates.append(n)
-    if candidates:
-        return candidates[0]
+    if classified.named_image is not None:
+        return classified.named_image
 
     # 4) Fallback: first image node in the tree
-    for n in tree.nodes:
-        if _is_image_node(n):
-            return n
+    if classified.image_nodes:
+        return classified.image_nodes[0]
 
     return None
 
-def _guess_alpha_source(mat, base_img_node):
+def _guess_alpha_source(mat, base_img_node, classified=None):
     """
     Return:
       - ('FROM_BASE', None): use base image alpha output
@@ -130,178 +168,253 @@ def _guess_alpha_source(mat, base_img_node):
     if not mat.use_nodes or not mat.node_tree:
         return ('NONE', None)
     tree = mat.node_tree
+    if classified is None:
+        classified = _classify_tree(tree)
 
     # If material already suggests blending, assume it needs alpha
     # (blend_method is Eevee setting but a useful hint)
-    try:
-        if getattr(mat, "blend_method", "OPAQUE") != "OPAQUE":
-            if base_img_node and base_img_node.image:
-                return ('FROM_BASE', None)
-    except Exception:
-        pass
+    if getattr(mat, "blend_method", "OPAQUE") != "OPAQUE":
+        if base_img_node and base_img_node.image:
+            return ('FROM_BASE', None)
 
     # Look for dedicated alpha image node by name
-    for n in tree.nodes:
-        if _is_image_node(n):
-            nm = (n.name or "").lower()
-            if "alpha" in nm or "opacity" in nm or "transparent" in nm:
-                return ('SEPARATE_IMAGE', n)
+    if classified.alpha_image is not None:
+        return ('SEPARATE_IMAGE', classified.alpha_image)
 
-    # If base image has alpha channel info, use it
+    # If base image exists, use its alpha output.
+    # Image depth is not checked: some images report depth=24 even if they have alpha,
+    # and base alpha may still be meaningful either way.
     if base_img_node and base_img_node.image:
-        img = base_img_node.image
-        # Heuristic: 32-bit images commonly include alpha
-        # Note: some images may report depth=24 even if they have alpha; still OK to use alpha output.
-        try:
-            if getattr(img, "depth", 0) >= 32:
-                return ('FROM_BASE', None)
-        except Exception:
-            pass
-
-        # Even if depth check fails, base alpha may still be meaningful
         return ('FROM_BASE', None)
 
     return ('NONE', None)
 
-def _copy_uvmap_setting(src_img_node, dst_img_node):
+def _copy_tex_node_settings(src_img_node, dst_img_node):
+    """Copy sampling settings from the source image node (always a TEX_IMAGE)."""
+    dst_img_node.interpolation = src_img_node.interpolation
+    dst_img_node.extension = src_img_node.extension
+
+def _set_colorspace(img, name, colorspace_state):
+    """
+    Set img's colorspace unless it is already `name`.
+    Every write makes Blender reload the image, and VRM body/face textures are shared by many materials.
+    colorspace_state: image pointer -> colorspace name, shared across one operator run.
+    """
+    key = img.as_pointer()
+    if colorspace_state.get(key) == name:
+        return
     try:
-        dst_img_node.uv_map = getattr(src_img_node, "uv_map", "")
+        if img.colorspace_settings.name != name:
+            img.colorspace_settings.name = name
+        colorspace_state[key] = name
     except Exception:
         pass
 
 def _ensure_cycles_transparency_settings(mat, use_alpha):
     # These are mainly Eevee/viewport related, but harmless and convenient.
     # Cycles transparency is done by shader mix.
-    try:
+    # shadow_method was removed in Blender 4.2, so guard each property separately.
+    if hasattr(mat, "blend_method"):
         mat.blend_method = 'BLEND' if use_alpha else 'OPAQUE'
+    if hasattr(mat, "shadow_method"):
         mat.shadow_method = 'HASHED' if use_alpha else 'OPAQUE'
-    except Exception:
-        pass
 
 
 # -----------------------------
 # Core conversion
 # -----------------------------
-def build_simple_cycles_material(new_mat, base_img_node=None, alpha_mode=('NONE', None), normal_info=(None, None)):
+# Node names of the simple layout. A tree built by an earlier run can be recognised
+# by these and reused in place instead of being cleared and rebuilt.
+_N_OUTPUT = "VRM_Simple_Output"
+_N_PRINCIPLED = "VRM_Simple_Principled"
+_N_BASE = "VRM_Simple_Base"
+_N_NORMAL_TEX = "VRM_Simple_Normal"
+_N_NORMAL_MAP = "VRM_Simple_NormalMap"
+_N_TRANSPARENT = "VRM_Simple_Transparent"
+_N_MIX = "VRM_Simple_Mix"
+_N_ALPHA = "VRM_Simple_Alpha"
+
+def _socket(nodes, ref):
+    """ref: (node name, "inputs" or "outputs", index or socket name)"""
+    name, side, key = ref
+    return getattr(nodes[name], side)[key]
+
+def _is_vrm_simple_layout(tree, node_specs, link_specs):
+    """True if tree holds exactly node_specs (by name and type), wired exactly as link_specs."""
+    nodes = tree.nodes
+    if len(nodes) != len(node_specs) or len(tree.links) != len(link_specs):
+        return False
+    for name, (idname, _location) in node_specs.items():
+        n = nodes.get(name)
+        if n is None or n.bl_idname != idname:
+            return False
+    wanted = {(_socket(nodes, a).as_pointer(), _socket(nodes, b).as_pointer()) for a, b in link_specs}
+    have = {(lk.from_socket.as_pointer(), lk.to_socket.as_pointer()) for lk in tree.links}
+    return wanted == have
+
+def _assign_image_node(dst_img_node, src_img_node, colorspace, colorspace_state):
+    dst_img_node.image = src_img_node.image
+    _copy_tex_node_settings(src_img_node, dst_img_node)
+    _set_colorspace(dst_img_node.image, colorspace, colorspace_state)
+
+def build_simple_cycles_material(new_mat, base_img_node=None, alpha_mode=('NONE', None), normal_info=(None, None), colorspace_state=None):
     """
     Create:
       Image Texture -> Principled Base Color
       (Alpha) Image Alpha -> Mix Fac (Transparent, Principled)
       (Normal optional) Image -> Normal Map -> Principled Normal
+    If new_mat already holds this exact layout (re-run with overwrite), its nodes are
+    reused: images, node locations and the values set here (Roughness, Metallic,
+    opaque Mix factor) are reassigned, but other input defaults the user edited
+    since the last run are kept, where a rebuild would reset them.
     """
+    if colorspace_state is None:
+        colorspace_state = {}
+
     new_mat.use_nodes = True
     tree = new_mat.node_tree
     nodes = tree.nodes
-    links = tree.links
 
-    # Clear old nodes
-    nodes.clear()
-
-    out = nodes.new("ShaderNodeOutputMaterial")
-    out.location = (600, 0)
+    has_base = bool(base_img_node and base_img_node.image)
+    normal_img_node, _normalmap_node = normal_info
+    has_normal = bool(normal_img_node and normal_img_node.image)
 
-    principled = nodes.new("ShaderNodeBsdfPrincipled")
-    principled.location = (250, 0)
-    principled.inputs["Roughness"].default_value = 0.5
-    principled.inputs["Metallic"].default_value = 0.0
+    # Alpha handling (Cycles-safe): Mix Transparent + Principled with alpha factor
+    use_alpha = (alpha_mode[0] != 'NONE')
+    alpha_from = None  # 'BASE', 'SEPARATE' or None (fully opaque fallback)
+    if use_alpha:
+        if alpha_mode[0] == 'FROM_BASE' and has_base:
+            alpha_from = 'BASE'
+        elif alpha_mode[0] == 'SEPARATE_IMAGE' and alpha_mode[1] is not None and getattr(alpha_mode[1], "image", None) is not None:
+            alpha_from = 'SEPARATE'
+
+    # Socket indices used below are stable across Blender versions:
+    #   TexImage outputs: 0=Color, 1=Alpha / MixShader inputs: 0=Fac, 1/2=Shader
+    #   single-output nodes: outputs[0] / Material Output inputs: 0=Surface
+    # Principled inputs moved around in 4.0, so those are still looked up by name.
+
+    # Phase 1: describe the layout.
+    #   node_specs: node name -> (bl_idname, location)
+    #   link_specs: (from_socket ref, to_socket ref), see _socket()
+    node_specs = {
+        _N_OUTPUT: ("ShaderNodeOutputMaterial", (600, 0)),
+        _N_PRINCIPLED: ("ShaderNodeBsdfPrincipled", (250, 0)),
+    }
+    link_specs = []
 
     # Base color
-    tex = None
-    if base_img_node and base_img_node.image:
-        tex = nodes.new("ShaderNodeTexImage")
-        tex.location = (-200, 0)
-        tex.image = base_img_node.image
-        tex.interpolation = getattr(base_img_node, "interpolation", 'Linear')
-        tex.extension = getattr(base_img_node, "extension", 'REPEAT')
-        _copy_uvmap_setting(base_img_node, tex)
-
-        # Ensure correct colorspace for base color
-        try:
-            tex.image.colorspace_settings.name = "sRGB"
-        except Exception:
-            pass
-
-        links.new(tex.outputs.get("Color"), principled.inputs.get("Base Color"))
+    if has_base:
+        node_specs[_N_BASE] = ("ShaderNodeTexImage", (-200, 0))
+        link_specs.append(((_N_BASE, "outputs", 0), (_N_PRINCIPLED, "inputs", "Base Color")))
 
     # Normal (optional)
-    normal_img_node, _normalmap_node = normal_info
-    if normal_img_node and normal_img_node.image:
-        tex_n = nodes.new("ShaderNodeTexImage")
-        tex_n.location = (-200, -280)
-        tex_n.image = normal_img_node.image
-        tex_n.interpolation = getattr(normal_img_node, "interpolation", 'Linear')
-        tex_n.extension = getattr(normal_img_node, "extension", 'REPEAT')
-        _copy_uvmap_setting(normal_img_node, tex_n)
-
-        # Normal map should be Non-Color
-        try:
-            tex_n.image.colorspace_settings.name = "Non-Color"
-        except Exception:
-            pass
+    if has_normal:
+        node_specs[_N_NORMAL_TEX] = ("ShaderNodeTexImage", (-200, -280))
+        node_specs[_N_NORMAL_MAP] = ("ShaderNodeNormalMap", (40, -280))
+        link_specs.append(((_N_NORMAL_TEX, "outputs", 0), (_N_NORMAL_MAP, "inputs", "Color")))
+        link_specs.append(((_N_NORMAL_MAP, "outputs", 0), (_N_PRINCIPLED, "inputs", "Normal")))
 
-        nmap = nodes.new("ShaderNodeNormalMap")
-        nmap.location = (40, -280)
-        links.new(tex_n.outputs.get("Color"), nmap.inputs.get("Color"))
-        links.new(nmap.outputs.get("Normal"), principled.inputs.get("Normal"))
-
-    # Alpha handling (Cycles-safe): Mix Transparent + Principled with alpha factor
-    use_alpha = (alpha_mode[0] != 'NONE')
     if use_alpha:
-        transparent = nodes.new("ShaderNodeBsdfTransparent")
-        transparent.location = (250, -220)
-
-        mix = nodes.new("ShaderNodeMixShader")
-        mix.location = (420, -80)
+        node_specs[_N_TRANSPARENT] = ("ShaderNodeBsdfTransparent", (250, -220))
+        node_specs[_N_MIX] = ("ShaderNodeMixShader", (420, -80))
 
         # Mix: Fac=alpha (0 => Transparent, 1 => Principled)
         # Shader1 = Transparent, Shader2 = Principled
-        links.new(transparent.outputs.get("BSDF"), mix.inputs[1])
-        links.new(principled.outputs.get("BSDF"), mix.inputs[2])
+        link_specs.append(((_N_TRANSPARENT, "outputs", 0), (_N_MIX, "inputs", 1)))
+        link_specs.append(((_N_PRINCIPLED, "outputs", 0), (_N_MIX, "inputs", 2)))
 
-        if alpha_mode[0] == 'FROM_BASE' and tex is not None:
-            links.new(tex.outputs.get("Alpha"), mix.inputs.get("Fac"))
-        elif alpha_mode[0] == 'SEPARATE_IMAGE' and alpha_mode[1] is not None and getattr(alpha_mode[1], "image", None) is not None:
-            aimg_src = alpha_mode[1]
-            tex_a = nodes.new("ShaderNodeTexImage")
-            tex_a.location = (-200, -140)
-            tex_a.image = aimg_src.image
-            tex_a.interpolation = getattr(aimg_src, "interpolation", 'Linear')
-            tex_a.extension = getattr(aimg_src, "extension", 'REPEAT')
-            _copy_uvmap_setting(aimg_src, tex_a)
-            # Alpha texture is usually Non-Color
-            try:
-                tex_a.image.colorspace_settings.name = "Non-Color"
-            except Exception:
-                pass
-
-            # Prefer Alpha output if present; else use Color->RGB to BW
-            if tex_a.outputs.get("Alpha") is not None:
-                links.new(tex_a.outputs.get("Alpha"), mix.inputs.get("Fac"))
-            else:
-                links.new(tex_a.outputs.get("Color"), mix.inputs.get("Fac"))
-        else:
-            # Fallback: fully opaque if alpha not found
-            mix.inputs.get("Fac").default_value = 1.0
+        if alpha_from == 'BASE':
+            link_specs.append(((_N_BASE, "outputs", 1), (_N_MIX, "inputs", 0)))
+        elif alpha_from == 'SEPARATE':
+            node_specs[_N_ALPHA] = ("ShaderNodeTexImage", (-200, -140))
+            link_specs.append(((_N_ALPHA, "outputs", 1), (_N_MIX, "inputs", 0)))
 
-        links.new(mix.outputs.get("Shader"), out.inputs.get("Surface"))
+        link_specs.append(((_N_MIX, "outputs", 0), (_N_OUTPUT, "inputs", 0)))
+    else:
+        link_specs.append(((_N_PRINCIPLED, "outputs", 0), (_N_OUTPUT, "inputs", 0)))
+
+    # Phase 2: reuse a matching tree from an earlier run, otherwise clear and
+    # create every node first, then all links in one go.
+    if not _is_vrm_simple_layout(tree, node_specs, link_specs):
+        nodes.clear()
+        nodes_new = nodes.new
+        for name, (idname, location) in node_specs.items():
+            n = nodes_new(idname)
+            n.name = name
+            n.location = location
+
+        links_new = tree.links.new
+        for from_ref, to_ref in link_specs:
+            links_new(_socket(nodes, from_ref), _socket(nodes, to_ref))
     else:
-        links.new(principled.outputs.get("BSDF"), out.inputs.get("Surface"))
+        # Reused: put the nodes back where a rebuild would place them
+        for name, (_idname, location) in node_specs.items():
+            nodes[name].location = location
+
+    # Phase 3: images and values (applied to reused trees as well)
+    p_inputs = nodes[_N_PRINCIPLED].inputs
+    p_inputs["Roughness"].default_value = 0.5
+    p_inputs["Metallic"].default_value = 0.0
+
+    if has_base:
+        # Ensure correct colorspace for base color
+        _assign_image_node(nodes[_N_BASE], base_img_node, "sRGB", colorspace_state)
+    if has_normal:
+        # Normal map should be Non-Color
+        _assign_image_node(nodes[_N_NORMAL_TEX], normal_img_node, "Non-Color", colorspace_state)
+    if alpha_from == 'SEPARATE':
+        # Alpha texture is usually Non-Color
+        _assign_image_node(nodes[_N_ALPHA], alpha_mode[1], "Non-Color", colorspace_state)
+    elif use_alpha and alpha_from is None:
+        # Fallback: fully opaque if alpha not found
+        nodes[_N_MIX].inputs[0].default_value = 1.0
 
     _ensure_cycles_transparency_settings(new_mat, use_alpha)
 
     return use_alpha
 
 
+def _analyze_material(mat):
+    """
+    Run every guesser on a source material, sharing one node classification
+    and one link index.
+    Returns (base_img_node, alpha_mode, normal_info).
+    """
+    if not mat.use_nodes or not mat.node_tree:
+        return None, ('NONE', None), (None, None)
+    tree = mat.node_tree
+
+    classified = _classify_tree(tree)
+    link_index = _build_link_index(tree)
+    base_img = _guess_basecolor_image_node(mat, classified, link_index)
+    alpha_mode = _guess_alpha_source(mat, base_img, classified)
+    normal_info = _find_upstream_normal_image(tree, classified, link_index)
+    return base_img, alpha_mode, normal_info
+
+
+TARGET_TYPES = frozenset({'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'})
+
 def collect_target_objects(context, scope):
-    if scope == 'SELECTED':
-        return [o for o in context.selected_objects if o.type in {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}]
-    else:
-        return [o for o in context.scene.objects if o.type in {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}]
+    # Objects without material slots would contribute nothing, so drop them here.
+    src = context.selected_objects if scope == 'SELECTED' else context.scene.objects
+    return [o for o in src if o.type in TARGET_TYPES and len(o.material_slots)]
 
 
-def convert_object_materials(obj, create_new, overwrite, cache_map):
+SIMPLE_PREFIX = "VRM_SIMPLE_"
+
+def _should_skip(mat, overwrite):
+    """Fast reject for materials this add-on already produced, before any analysis."""
+    # Test the flag first so the name is only read when it matters.
+    return not overwrite and mat.name.startswith(SIMPLE_PREFIX)
+
+
+def convert_object_materials(obj, create_new, overwrite, cache_map, colorspace_state=None, skipped_ptrs=None):
     """
     cache_map: old_mat -> new_mat (to avoid duplicates)
+      Also covers in-place overwrite (new is old), so each material is rebuilt at most once per run.
+    colorspace_state: image pointer -> colorspace name already applied (see _set_colorspace)
+    skipped_ptrs: pointers of materials analysed and left alone (no content); shared
+      across objects like cache_map, so those are analysed at most once per run too
     Returns (converted_count, slot_count)
     """
     converted = 0
@@ -312,36 +425,50 @@ def convert_object_materials(obj, create_new, overwrite, cache_map):
         old = slot.material
         if old is None:
             continue
-        if old.name.startswith("VRM_SIMPLE_") and not overwrite:
+        if _should_skip(old, overwrite):
             continue
 
         if old in cache_map:
             slot.material = cache_map[old]
             continue
+        if skipped_ptrs is not None and old.as_pointer() in skipped_ptrs:
+            continue
+
+        if not create_new:
+            if not overwrite:
+                # If not creating new and not overwriting, nothing to do
+                continue
+            # Overwriting in place (new is old): ensure nodes exist before analysing
+            old.use_nodes = True
+
+        # Extract base/alpha/normal from old (not new)
+        base_img, alpha_mode, normal_info = _analyze_material(old)
+
+        # Nothing to carry over (e.g. placeholder materials): the result would be a bare
+        # Principled BSDF, so leave the original alone unless asked to overwrite.
+        has_content = base_img is not None or alpha_mode[0] != 'NONE' or normal_info[0] is not None
+        if not has_content and not overwrite:
+            if skipped_ptrs is not None:
+                skipped_ptrs.add(old.as_pointer())
+            continue
 
         # Decide target material object
         if create_new:
             new = old.copy()
-            new.name = f"VRM_SIMPLE_{old.name}"
+            new.name = f"{SIMPLE_PREFIX}{old.name}"
         else:
-            if overwrite:
-                new = old
-            else:
-                # If not creating new and not overwriting, nothing to do
-                continue
+            new = old
 
         # Ensure nodes exist
         new.use_nodes = True
 
-        # Extract base/alpha/normal from old (not new)
-        base_img = _guess_basecolor_image_node(old)
-        alpha_mode = _guess_alpha_source(old, base_img)
-
-        normal_img_node, normal_map_node = (None, None)
-        if old.use_nodes and old.node_tree:
-            normal_img_node, normal_map_node = _find_upstream_normal_image(old.node_tree)
-
-        build_simple_cycles_material(new, base_img_node=base_img, alpha_mode=alpha_mode, normal_info=(normal_img_node, normal_map_node))
+        build_simple_cycles_material(
+            new,
+            base_img_node=base_img,
+            alpha_mode=alpha_mode,
+            normal_info=normal_info,
+            colorspace_state=colorspace_state
+        )
 
         cache_map[old] = new
         slot.material = new
@@ -386,6 +513,8 @@ class VRM_OT_replace_with_cycles_simple(bpy.types.Operator):
             return {"CANCELLED"}
 
         cache_map = {}
+        colorspace_state = {}
+        skipped_ptrs = set()
         total_converted = 0
         total_slots = 0
 
@@ -394,7 +523,9 @@ class VRM_OT_replace_with_cycles_simple(bpy.types.Operator):
                 obj,
                 create_new=self.create_new_materials,
                 overwrite=self.overwrite_existing_simple,
-                cache_map=cache_map
+                cache_map=cache_map,
+                colorspace_state=colorspace_state,
+                skipped_ptrs=skipped_ptrs
             )
             total_converted += c
             total_slots += s
@@ -9,108 +9,125 @@ bl_info = {
 }
 
 import bpy
+import re
+import numpy as np
 from bpy.props import BoolProperty, EnumProperty, FloatProperty
 
 
 # -----------------------------
 # Helpers (detect base color image, alpha)
 # -----------------------------
-def _is_image_node(n):
-    return n and n.type == 'TEX_IMAGE' and getattr(n, "image", None) is not None
+# Name keywords, matched as substrings of lowercased names
+_BASE_KEYS_RE = re.compile(r"main|base|albedo|color|diffuse")
+_ALPHA_KEYS_RE = re.compile(r"alpha|opacity|transparent")
+_EMISSION_KEYS_RE = re.compile(r"emission|emissive")
 
-def _find_principled_node(tree):
-    for n in tree.nodes:
-        if n.type == 'BSDF_PRINCIPLED':
-            return n
-    return None
-
-def _find_upstream_image_from_socket(sock, max_depth=12, visited=None):
-    if visited is None:
-        visited = set()
-    if sock is None or sock in visited:
-        return None
-    visited.add(sock)
+def _is_image_node(n):
+    # TEX_IMAGE nodes always have .image (possibly None); other types short-circuit first
+    return n and n.type == 'TEX_IMAGE' and n.image is not None
 
-    if not sock.is_linked:
+def _find_upstream_image_from_socket(sock, max_nodes=256):
+    """Trace upstream links to the first TEX_IMAGE node (iterative DFS, each node expanded once)."""
+    if sock is None or not sock.is_linked:
         return None
-
-    for link in sock.links:
-        n = link.from_node
-        if _is_image_node(n):
-            return n
-        if max_depth <= 0:
-            continue
-        for inp in getattr(n, "inputs", []):
-            if inp.is_linked:
-                found = _find_upstream_image_from_socket(inp, max_depth - 1, visited)
-                if found:
-                    return found
+    seen_nodes = set()
+    stack = [sock]
+
+    while stack and len(seen_nodes) < max_nodes:
+        sock = stack.pop()
+        for link in sock.links:
+            n = link.from_node
+            if _is_image_node(n):
+                return n
+            # Int pointers instead of bpy node objects: cheap to hash, nothing pinned
+            ptr = n.as_pointer()
+            if ptr in seen_nodes:
+                continue
+            seen_nodes.add(ptr)
+            # Only linked inputs are pushed; reversed so the first one is explored first
+            linked = [inp for inp in n.inputs if inp.is_linked]
+            stack.extend(reversed(linked))
     return None
 
-def guess_basecolor_image_node(mat):
+def _scan_tree(tree):
+    """
+    Walk tree.nodes once and record everything the guessers look for:
+    principled, first_image, basecolor_named, alpha_named (TEX_IMAGE nodes with an image),
+    group_nodes, emission_nodes.
+    """
+    scan = {
+        'principled': None,
+        'first_image': None,
+        'basecolor_named': None,
+        'alpha_named': None,
+        'group_nodes': [],
+        'emission_nodes': [],
+    }
+    for n in tree.nodes:
+        t = n.type
+        if t == 'TEX_IMAGE':
+            if n.image is None:
+                continue
+            if scan['first_image'] is None:
+                scan['first_image'] = n
+            nm = (n.name or "").lower()
+            if scan['basecolor_named'] is None and _BASE_KEYS_RE.search(nm):
+                scan['basecolor_named'] = n
+            if scan['alpha_named'] is None and _ALPHA_KEYS_RE.search(nm):
+                scan['alpha_named'] = n
+        elif t == 'BSDF_PRINCIPLED':
+            if scan['principled'] is None:
+                scan['principled'] = n
+        elif t == 'GROUP':
+            if n.node_tree:
+                scan['group_nodes'].append(n)
+        elif t == 'EMISSION':
+            scan['emission_nodes'].append(n)
+    return scan
+
+def guess_basecolor_image_node(mat, scan=None):
     if not mat or not mat.use_nodes or not mat.node_tree:
         return None
-    tree = mat.node_tree
+    if scan is None:
+        scan = _scan_tree(mat.node_tree)
 
-    principled = _find_principled_node(tree)
+    principled = scan['principled']
     if principled:
         base_in = principled.inputs.get("Base Color")
-        img = _find_upstream_image_from_socket(base_in)
-        if img:
-            return img
-
-    keys = ("main", "base", "albedo", "color", "maintex", "diffuse")
-    candidates = []
-    for n in tree.nodes:
-        if _is_image_node(n):
-            nm = (n.name or "").lower()
-            if any(k in nm for k in keys):
-                candidates.append(n)
-    if candidates:
-        return candidates[0]
+        # Unlinked Base Color (flat default_value): go straight to the name heuristics
+        if base_in is not None and base_in.is_linked:
+            img = _find_upstream_image_from_socket(base_in)
+            if img:
+                return img
 
-    for n in tree.nodes:
-        if _is_image_node(n):
-            return n
-
-    return None
+    return scan['basecolor_named'] or scan['first_image']
 
-def guess_alpha_need(mat, base_img_node):
+def guess_alpha_need(mat, base_img_node, scan=None):
     if not mat or not mat.use_nodes or not mat.node_tree:
         return ('NONE', None)
-    tree = mat.node_tree
+    base_img = base_img_node.image if base_img_node else None
 
-    # First priority: check if the material itself was set to transparent
-    try:
-        if getattr(mat, "blend_method", "OPAQUE") != "OPAQUE":
-            if base_img_node and base_img_node.image:
-                return ('FROM_BASE', None)
-    except Exception:
-        pass
+    # First priority: the material itself was set to transparent
+    if base_img is not None and getattr(mat, "blend_method", "OPAQUE") != "OPAQUE":
+        return ('FROM_BASE', None)
 
     # Second priority: look for separate alpha/opacity texture nodes
-    for n in tree.nodes:
-        if _is_image_node(n):
-            nm = (n.name or "").lower()
-            if ("alpha" in nm) or ("opacity" in nm) or ("transparent" in nm):
-                return ('SEPARATE_IMAGE', n)
+    if scan is None:
+        scan = _scan_tree(mat.node_tree)
+    if scan['alpha_named'] is not None:
+        return ('SEPARATE_IMAGE', scan['alpha_named'])
 
     # Third priority: check if base texture has an alpha channel
-    if base_img_node and base_img_node.image:
-        img = base_img_node.image
-        try:
-            # Check if image has alpha channel (RGBA = 4 channels)
-            if getattr(img, "channels", 0) == 4:
-                return ('FROM_BASE', None)
-            # Some images report has_alpha flag
-            if getattr(img, "alpha_mode", None) in {'STRAIGHT', 'PREMUL'}:
-                return ('FROM_BASE', None)
-        except Exception:
-            pass
-
+    if base_img is None:
+        return ('NONE', None)
+    # RGBA image, or one that reports an alpha mode
+    if getattr(base_img, "channels", 0) == 4:
+        return ('FROM_BASE', None)
+    if getattr(base_img, "alpha_mode", None) in {'STRAIGHT', 'PREMUL'}:
+        return ('FROM_BASE', None)
     return ('NONE', None)
 
-def guess_emission_info(mat):
+def guess_emission_info(mat, scan=None):
     """Detect emission color, strength, and texture from the original material.
     Returns (emission_color, emission_strength, emission_image_node).
     emission_color is an (R, G, B, A) tuple.
@@ -118,22 +135,23 @@ def guess_emission_info(mat):
     default = ((0, 0, 0, 1), 0.0, None)
     if not mat or not mat.use_nodes or not mat.node_tree:
         return default
-    tree = mat.node_tree
+    if scan is None:
+        scan = _scan_tree(mat.node_tree)
 
     # --- Try Principled BSDF first ---
-    principled = _find_principled_node(tree)
+    principled = scan['principled']
     if principled:
         # Emission Color input
         em_color_in = (principled.inputs.get("Emission Color")
                        or principled.inputs.get("Emission"))
         em_strength_in = principled.inputs.get("Emission Strength")
 
-        em_color = (0, 0, 0, 1)
+        em_dv = None
         em_strength = 0.0
         em_img = None
 
         if em_color_in is not None:
-            em_color = tuple(em_color_in.default_value)
+            em_dv = em_color_in.default_value
             # Check for connected image texture
             em_img = _find_upstream_image_from_socket(em_color_in)
 
@@ -141,62 +159,198 @@ def guess_emission_info(mat):
             em_strength = em_strength_in.default_value
 
         # If no explicit strength but color is non-black, assume strength=1
-        if em_strength == 0.0 and em_color[:3] != (0, 0, 0):
+        if em_strength == 0.0 and em_dv is not None and (em_dv[0] or em_dv[1] or em_dv[2]):
             em_strength = 1.0
 
         if em_strength > 0.0 or em_img is not None:
+            # Tuple only built on the return path
+            em_color = tuple(em_dv) if em_dv is not None else (0, 0, 0, 1)
             return (em_color, em_strength, em_img)
 
     # --- Try MToon-style group nodes ---
-    emission_keys = ("emission", "_emissioncolor", "emissionfactor", "emissive")
-    for n in tree.nodes:
-        if n.type == 'GROUP' and n.node_tree:
-            for inp in n.inputs:
-                nm = (inp.name or "").lower().replace(" ", "")
-                if any(k in nm for k in emission_keys):
-                    if inp.type == 'RGBA' or inp.type == 'VECTOR':
-                        col = tuple(inp.default_value)
+    for n in scan['group_nodes']:
+        for inp in n.inputs:
+            if _EMISSION_KEYS_RE.search((inp.name or "").lower()):
+                if inp.type == 'RGBA' or inp.type == 'VECTOR':
+                    dv = inp.default_value
+                    if dv[0] or dv[1] or dv[2]:
+                        col = tuple(dv)
                         if len(col) == 3:
                             col = col + (1.0,)
-                        if col[:3] != (0, 0, 0):
-                            img = _find_upstream_image_from_socket(inp)
-                            return (col, 1.0, img)
+                        img = _find_upstream_image_from_socket(inp)
+                        return (col, 1.0, img)
 
     # --- Try any Emission shader node ---
-    for n in tree.nodes:
-        if n.type == 'EMISSION':
-            col_in = n.inputs.get("Color")
-            str_in = n.inputs.get("Strength")
-            if col_in is not None:
-                col = tuple(col_in.default_value)
-                strength = str_in.default_value if str_in else 1.0
+    for n in scan['emission_nodes']:
+        col_in = n.inputs.get("Color")
+        str_in = n.inputs.get("Strength")
+        if col_in is not None:
+            strength = str_in.default_value if str_in else 1.0
+            if strength > 0.0:
+                dv = col_in.default_value
                 img = _find_upstream_image_from_socket(col_in)
-                if strength > 0.0 and (col[:3] != (0, 0, 0) or img is not None):
-                    return (col, strength, img)
+                if dv[0] or dv[1] or dv[2] or img is not None:
+                    return (tuple(dv), strength, img)
 
     return default
 
-def copy_uvmap_setting(src_img_node, dst_img_node):
+def analyze_material(mat):
+    """Run all guessers on a source material.
+    Returns (base_img_node, alpha_mode, (emission_color, emission_strength, emission_image_node)).
+    """
+    # One node walk shared by all three guessers
+    scan = _scan_tree(mat.node_tree) if mat and mat.use_nodes and mat.node_tree else None
+    base_img = guess_basecolor_image_node(mat, scan)
+    alpha_mode = guess_alpha_need(mat, base_img, scan)
+    em_info = guess_emission_info(mat, scan)
+    return base_img, alpha_mode, em_info
+
+def set_colorspace(img, name, colorspace_state=None):
+    """
+    Set img's colorspace unless it is already `name`.
+    colorspace_state: image pointer -> colorspace name, shared across one operator run
+    so images used by many materials are only touched once.
+    """
+    key = img.as_pointer()
+    if colorspace_state is not None and colorspace_state.get(key) == name:
+        return
     try:
-        dst_img_node.uv_map = getattr(src_img_node, "uv_map", "")
+        # Colorspace names depend on the OCIO config
+        if img.colorspace_settings.name != name:
+            img.colorspace_settings.name = name
+        if colorspace_state is not None:
+            colorspace_state[key] = name
     except Exception:
         pass
 
+def copy_tex_node_settings(src_img_node, dst_img_node):
+    """Copy sampling settings from the source image node (always a TEX_IMAGE)."""
+    dst_img_node.interpolation = src_img_node.interpolation
+    dst_img_node.extension = src_img_node.extension
+
 
 # -----------------------------
 # Eevee engine helper
 # -----------------------------
+_EEVEE_ENGINE = None  # resolved on first use; the enum does not change at runtime
+
 def ensure_eevee_engine(scene):
+    global _EEVEE_ENGINE
     try:
-        engines = bpy.types.RenderSettings.bl_rna.properties["engine"].enum_items.keys()
-        if "BLENDER_EEVEE_NEXT" in engines:
-            scene.render.engine = "BLENDER_EEVEE_NEXT"
-        elif "BLENDER_EEVEE" in engines:
-            scene.render.engine = "BLENDER_EEVEE"
+        if _EEVEE_ENGINE is None:
+            engines = bpy.types.RenderSettings.bl_rna.properties["engine"].enum_items.keys()
+            if "BLENDER_EEVEE_NEXT" in engines:
+                _EEVEE_ENGINE = "BLENDER_EEVEE_NEXT"
+            elif "BLENDER_EEVEE" in engines:
+                _EEVEE_ENGINE = "BLENDER_EEVEE"
+            else:
+                return
+        if scene.render.engine != _EEVEE_ENGINE:
+            scene.render.engine = _EEVEE_ENGINE
     except Exception:
         pass
 
 
+# -----------------------------
+# Node building helpers
+# -----------------------------
+# Node type ids used by the builders
+_T_OUTPUT = "ShaderNodeOutputMaterial"
+_T_PRINCIPLED = "ShaderNodeBsdfPrincipled"
+_T_TEX = "ShaderNodeTexImage"
+_T_MIX_RGB = "ShaderNodeMixRGB"
+_T_MATH = "ShaderNodeMath"
+_T_GROUP = "ShaderNodeGroup"
+_T_GROUP_OUTPUT = "NodeGroupOutput"
+_T_DIFFUSE = "ShaderNodeBsdfDiffuse"
+_T_SHADER_TO_RGB = "ShaderNodeShaderToRGB"
+_T_RGB_TO_BW = "ShaderNodeRGBToBW"
+_T_RAMP = "ShaderNodeValToRGB"
+
+def _add(nodes, node_type, x, y):
+    """Create a node of node_type at (x, y)."""
+    n = nodes.new(node_type)
+    n.location = (x, y)
+    return n
+
+
+# -----------------------------
+# Shared light factor group (Eevee)
+# -----------------------------
+LIGHT_GROUP_NAME = "VRM_TOON_LightFactor"
+
+def _clamp(x, lo=0.0, hi=1.0):
+    return lo if x < lo else (hi if x > hi else x)
+
+def _new_group_output(group, name, socket_type):
+    # Blender 4.0+ uses the interface API; 3.x has group.outputs
+    if hasattr(group, "interface"):
+        return group.interface.new_socket(name=name, in_out='OUTPUT', socket_type=socket_type)
+    return group.outputs.new(socket_type, name)
+
+def build_light_factor_group(ramp_center=0.62, ramp_softness=0.02, shadow_value=0.25):
+    """
+    Node group holding the LightFactor chain shared by every toon material:
+      Diffuse(white) -> ShaderToRGB -> RGBtoBW -> ColorRamp (smooth ramp edge)
+    Built once per run instead of once per material.
+    """
+    group = bpy.data.node_groups.new(LIGHT_GROUP_NAME, 'ShaderNodeTree')
+    _new_group_output(group, "Color", 'NodeSocketColor')
+    nodes = group.nodes
+    ln = group.links.new
+
+    diffuse = _add(nodes, _T_DIFFUSE, -650, 0)
+    diffuse.inputs[0].default_value = (1, 1, 1, 1)  # Color
+
+    shader_to_rgb = _add(nodes, _T_SHADER_TO_RGB, -430, 0)
+
+    rgb_to_bw = _add(nodes, _T_RGB_TO_BW, -250, 0)
+
+    ramp = _add(nodes, _T_RAMP, -70, 0)
+
+    g_out = _add(nodes, _T_GROUP_OUTPUT, 250, 0)
+
+    # --- Smooth edge setup (reduces polygon-edge jaggies) ---
+    c = _clamp(ramp_center)
+    s = _clamp(ramp_softness, 0.0, 0.2)
+    # c in [0, 1] and s >= 0: c - s can only undershoot, c + s only overshoot
+    p0 = c - s
+    if p0 < 0.0:
+        p0 = 0.0
+    p1 = c + s
+    if p1 > 1.0:
+        p1 = 1.0
+
+    # Ensure exactly 2 elements (a fresh ramp already has 2)
+    color_ramp = ramp.color_ramp
+    elements = color_ramp.elements
+    n = len(elements)
+    if n > 2:
+        for _ in range(n - 2):
+            elements.remove(elements[-1])
+    elif n < 2:
+        for _ in range(2 - n):
+            elements.new(0.5)
+
+    color_ramp.interpolation = 'EASE'
+
+    elements[0].position = p0
+    elements[0].color = (shadow_value, shadow_value, shadow_value, 1.0)
+
+    elements[1].position = p1
+    elements[1].color = (1.0, 1.0, 1.0, 1.0)
+
+    # Sockets by index (stable per node type):
+    #   Diffuse out[0]=BSDF, ShaderToRGB in[0]=Shader/out[0]=Color,
+    #   RGBToBW in[0]=Color/out[0]=Val, ValToRGB in[0]=Fac/out[0]=Color
+    ln(diffuse.outputs[0], shader_to_rgb.inputs[0])
+    ln(shader_to_rgb.outputs[0], rgb_to_bw.inputs[0])
+    ln(rgb_to_bw.outputs[0], ramp.inputs[0])
+    ln(ramp.outputs[0], g_out.inputs[0])
+
+    return group
+
+
 # -----------------------------
 # Build toon material (Eevee)
 # -----------------------------
@@ -211,7 +365,9 @@ def build_eevee_toon_material(
     shadow_value=0.25,
     emission_color=(0, 0, 0, 1),
     emission_strength=0.0,
-    emission_img_node=None
+    emission_img_node=None,
+    light_group=None,
+    colorspace_state=None
 ):
     """
     GLB-compatible toon material using Principled BSDF:
@@ -220,88 +376,54 @@ def build_eevee_toon_material(
       - Alpha: texture alpha → Principled BSDF Alpha (for glTF cutout)
 
     LightFactor (Eevee only):
-      Diffuse(white) -> ShaderToRGB -> RGBtoBW -> ColorRamp (smooth ramp edge)
+      group node from build_light_factor_group(); pass light_group to share one
+      group across materials, otherwise a new one is built from the ramp settings
+
+    colorspace_state: see set_colorspace()
     """
     new_mat.use_nodes = True
     tree = new_mat.node_tree
     nodes = tree.nodes
     links = tree.links
     nodes.clear()
+    # Bound once; used for every link created below
+    ln = links.new
 
-    out = nodes.new("ShaderNodeOutputMaterial")
-    out.location = (900, 0)
+    out = _add(nodes, _T_OUTPUT, 900, 0)
 
     # Base color texture
     tex = None
     if base_img_node and base_img_node.image:
-        tex = nodes.new("ShaderNodeTexImage")
-        tex.location = (-800, 120)
+        tex = _add(nodes, _T_TEX, -800, 120)
         tex.image = base_img_node.image
-        tex.interpolation = getattr(base_img_node, "interpolation", 'Linear')
-        tex.extension = getattr(base_img_node, "extension", 'REPEAT')
-        copy_uvmap_setting(base_img_node, tex)
-        try:
-            tex.image.colorspace_settings.name = "sRGB"
-        except Exception:
-            pass
-
-    # Lighting factor
-    diffuse = nodes.new("ShaderNodeBsdfDiffuse")
-    diffuse.location = (-650, -140)
-    diffuse.inputs["Color"].default_value = (1, 1, 1, 1)
+        copy_tex_node_settings(base_img_node, tex)
+        set_colorspace(tex.image, "sRGB", colorspace_state)
 
-    shader_to_rgb = nodes.new("ShaderNodeShaderToRGB")
-    shader_to_rgb.location = (-430, -140)
-
-    rgb_to_bw = nodes.new("ShaderNodeRGBToBW")
-    rgb_to_bw.location = (-250, -140)
-
-    ramp = nodes.new("ShaderNodeValToRGB")
-    ramp.location = (-70, -140)
-
-    # --- Smooth edge setup (reduces polygon-edge jaggies) ---
-    c = max(0.0, min(1.0, ramp_center))
-    s = max(0.0, min(0.2, ramp_softness))
-    p0 = max(0.0, min(1.0, c - s))
-    p1 = max(0.0, min(1.0, c + s))
-
-    try:
-        # Ensure exactly 2 elements
-        while len(ramp.color_ramp.elements) > 2:
-            ramp.color_ramp.elements.remove(ramp.color_ramp.elements[-1])
-        while len(ramp.color_ramp.elements) < 2:
-            ramp.color_ramp.elements.new(0.5)
-
-        ramp.color_ramp.interpolation = 'EASE'
-
-        ramp.color_ramp.elements[0].position = p0
-        ramp.color_ramp.elements[0].color = (shadow_value, shadow_value, shadow_value, 1.0)
-
-        ramp.color_ramp.elements[1].position = p1
-        ramp.color_ramp.elements[1].color = (1.0, 1.0, 1.0, 1.0)
-    except Exception:
-        pass
-
-    links.new(diffuse.outputs["BSDF"], shader_to_rgb.inputs["Shader"])
-    links.new(shader_to_rgb.outputs["Color"], rgb_to_bw.inputs["Color"])
-    links.new(rgb_to_bw.outputs["Val"], ramp.inputs["Fac"])
+    # Lighting factor (shared node group)
+    if light_group is None:
+        light_group = build_light_factor_group(ramp_center, ramp_softness, shadow_value)
+    light = _add(nodes, _T_GROUP, -70, -140)
+    light.node_tree = light_group
+    light.label = "Light Factor"
 
     # Multiply base color by ramp
-    mul = nodes.new("ShaderNodeMixRGB")
-    mul.location = (180, 20)
+    mul = _add(nodes, _T_MIX_RGB, 180, 20)
     mul.blend_type = 'MULTIPLY'
-    mul.inputs["Fac"].default_value = 1.0
+    # Sockets by index (stable per node type):
+    #   MixRGB in[0]=Fac, in[1]=Color1, in[2]=Color2, out[0]=Color
+    #   TexImage out[0]=Color, out[1]=Alpha; Math in[0]/in[1], out[0]=Value
+    # Principled inputs moved between versions and stay looked up by name.
+    mul.inputs[0].default_value = 1.0
 
     if tex is not None:
-        links.new(tex.outputs["Color"], mul.inputs["Color1"])
+        ln(tex.outputs[0], mul.inputs[1])
     else:
-        mul.inputs["Color1"].default_value = (1, 1, 1, 1)
+        mul.inputs[1].default_value = (1, 1, 1, 1)
 
-    links.new(ramp.outputs["Color"], mul.inputs["Color2"])
+    ln(light.outputs[0], mul.inputs[2])
 
     # --- Output via Principled BSDF (GLB/glTF compatible) ---
-    principled_out = nodes.new("ShaderNodeBsdfPrincipled")
-    principled_out.location = (600, 0)
+    principled_out = _add(nodes, _T_PRINCIPLED, 600, 0)
     principled_out.label = "Toon Output"
 
     # Flat matte look: no metallic, full roughness, no specular
@@ -316,7 +438,7 @@ def build_eevee_toon_material(
     # Base Color = toon result (texture × ramp)
     # - Eevee: toon ramp modulates the base → toon-like lighting bands
     # - GLB: exporter traces through MixRGB to find the Image Texture for baseColorTexture
-    links.new(mul.outputs["Color"], principled_out.inputs["Base Color"])
+    ln(mul.outputs[0], principled_out.inputs["Base Color"])
 
     # Emission Color = VRM emission ONLY (NOT toon result)
     # Direct texture/color connection so the glTF exporter can trace it cleanly
@@ -326,18 +448,12 @@ def build_eevee_toon_material(
     has_vrm_emission = (emission_strength > 0.0 or emission_img_node is not None)
     if has_vrm_emission:
         if emission_img_node is not None and emission_img_node.image:
-            tex_em = nodes.new("ShaderNodeTexImage")
-            tex_em.location = (-800, 320)
+            tex_em = _add(nodes, _T_TEX, -800, 320)
             tex_em.label = "VRM Emission Tex"
             tex_em.image = emission_img_node.image
-            tex_em.interpolation = getattr(emission_img_node, "interpolation", 'Linear')
-            tex_em.extension = getattr(emission_img_node, "extension", 'REPEAT')
-            copy_uvmap_setting(emission_img_node, tex_em)
-            try:
-                tex_em.image.colorspace_settings.name = "sRGB"
-            except Exception:
-                pass
-            links.new(tex_em.outputs["Color"], principled_out.inputs[emission_input_name])
+            copy_tex_node_settings(emission_img_node, tex_em)
+            set_colorspace(tex_em.image, "sRGB", colorspace_state)
+            ln(tex_em.outputs[0], principled_out.inputs[emission_input_name])
         else:
             ec = emission_color[:4] if len(emission_color) >= 4 else tuple(emission_color) + (1.0,)
             principled_out.inputs[emission_input_name].default_value = ec
@@ -350,81 +466,57 @@ def build_eevee_toon_material(
             emission_strength_input.default_value = 0.0
 
     # --- Alpha handling: build strict MASK chain (0/1) for reliable glTF MASK export ---
-    use_alpha = True
-
-    try:
-        principled_out.inputs["Alpha"].default_value = 1.0
-    except Exception:
-        pass
+    # No alpha source -> no mask nodes at all, material stays opaque
+    use_alpha = alpha_mode[0] != 'NONE'
 
-    try:
-        # Create a BW conversion + Greater Than math node to produce 0/1 mask
-        alpha_bw = nodes.new("ShaderNodeRGBToBW")
-        alpha_bw.location = (-240, 60)
+    principled_out.inputs["Alpha"].default_value = 1.0
 
-        alpha_thresh = nodes.new("ShaderNodeMath")
-        alpha_thresh.location = (-40, 60)
+    if use_alpha:
+        # Greater Than math node on the texture's Alpha output produces the 0/1 mask
+        alpha_thresh = _add(nodes, _T_MATH, -40, 60)
         alpha_thresh.operation = 'GREATER_THAN'
         # Second input is the threshold value
-        try:
-            alpha_thresh.inputs[1].default_value = alpha_clip_threshold
-        except Exception:
-            pass
+        alpha_thresh.inputs[1].default_value = alpha_clip_threshold
 
         connected_alpha = False
 
         # Prefer explicit alpha output from base texture
         if alpha_mode[0] == 'FROM_BASE' and tex is not None:
-            if tex.outputs.get("Alpha") is not None:
-                links.new(tex.outputs["Alpha"], alpha_thresh.inputs[0])
-                connected_alpha = True
-            else:
-                links.new(tex.outputs["Color"], alpha_bw.inputs["Color"])
-                links.new(alpha_bw.outputs["Val"], alpha_thresh.inputs[0])
-                connected_alpha = True
+            ln(tex.outputs[1], alpha_thresh.inputs[0])
+            connected_alpha = True
 
         # If separate alpha image is provided, use it
-        if not connected_alpha and alpha_mode[0] == 'SEPARATE_IMAGE' and alpha_mode[1] is not None and getattr(alpha_mode[1], "image", None) is not None:
+        if not connected_alpha and alpha_mode[0] == 'SEPARATE_IMAGE' and alpha_mode[1] is not None and alpha_mode[1].image is not None:
             a_src = alpha_mode[1]
-            tex_a = nodes.new("ShaderNodeTexImage")
-            tex_a.location = (-800, -40)
+            tex_a = _add(nodes, _T_TEX, -800, -40)
             tex_a.image = a_src.image
-            tex_a.interpolation = getattr(a_src, "interpolation", 'Linear')
-            tex_a.extension = getattr(a_src, "extension", 'REPEAT')
-            copy_uvmap_setting(a_src, tex_a)
-            try:
-                tex_a.image.colorspace_settings.name = "Non-Color"
-            except Exception:
-                pass
-
-            if tex_a.outputs.get("Alpha") is not None:
-                links.new(tex_a.outputs["Alpha"], alpha_thresh.inputs[0])
-            else:
-                links.new(tex_a.outputs["Color"], alpha_bw.inputs["Color"])
-                links.new(alpha_bw.outputs["Val"], alpha_thresh.inputs[0])
+            copy_tex_node_settings(a_src, tex_a)
+            set_colorspace(tex_a.image, "Non-Color", colorspace_state)
+
+            ln(tex_a.outputs[1], alpha_thresh.inputs[0])
             connected_alpha = True
 
         # Connect threshold output to Principled Alpha if we connected a source
         if connected_alpha:
-            links.new(alpha_thresh.outputs["Value"], principled_out.inputs["Alpha"])
-
-    except Exception:
-        pass
-
-    # Force material to use CLIP (MASK) for exporter
-    try:
-        new_mat.blend_method = 'CLIP'
-        new_mat.shadow_method = 'CLIP'
-        new_mat.alpha_threshold = alpha_clip_threshold
-    except Exception:
-        pass
+            ln(alpha_thresh.outputs[0], principled_out.inputs["Alpha"])
 
-    try:
+        # Force material to use CLIP (MASK) for exporter
+        blend = 'CLIP'
+        if hasattr(new_mat, "alpha_threshold"):
+            new_mat.alpha_threshold = alpha_clip_threshold
+    else:
+        blend = 'OPAQUE'
+
+    # EEVEE Legacy settings: shadow_method was removed in Blender 4.2 and the
+    # others may follow, so guard each property separately
+    if hasattr(new_mat, "blend_method"):
+        new_mat.blend_method = blend
+    if hasattr(new_mat, "shadow_method"):
+        new_mat.shadow_method = blend
+    if hasattr(new_mat, "use_backface_culling"):
         new_mat.use_backface_culling = False
-    except Exception:
-        pass
 
-    links.new(principled_out.outputs["BSDF"], out.inputs["Surface"])
+    ln(principled_out.outputs[0], out.inputs[0])  # BSDF -> Surface
 
     return use_alpha
 
@@ -435,20 +527,28 @@ def build_eevee_toon_material(
 def set_shade_smooth(obj):
     if obj.type == 'MESH' and obj.data:
         try:
-            for p in obj.data.polygons:
-                p.use_smooth = True
+            # One bulk write instead of an RNA call per polygon
+            polys = obj.data.polygons
+            n = len(polys)
+            if n:
+                polys.foreach_set("use_smooth", np.ones(n, dtype=bool))
+                obj.data.update()
         except Exception:
             pass
 
+WEIGHTED_NORMAL_NAME = "WeightedNormal"
+
 def ensure_weighted_normal(obj):
     if obj.type != 'MESH':
         return
-    # Avoid duplicates
-    for m in obj.modifiers:
-        if m.type == 'WEIGHTED_NORMAL':
-            return
+    mods = obj.modifiers
+    # Avoid duplicates: ours and user-added ones carry the default name
+    # (a renamed Weighted Normal modifier is not detected)
+    m = mods.get(WEIGHTED_NORMAL_NAME)
+    if m is not None and m.type == 'WEIGHTED_NORMAL':
+        return
     try:
-        mod = obj.modifiers.new(name="WeightedNormal", type='WEIGHTED_NORMAL')
+        mod = mods.new(name=WEIGHTED_NORMAL_NAME, type='WEIGHTED_NORMAL')
         # These properties may vary slightly by version; set safely
         if hasattr(mod, "keep_sharp"):
             mod.keep_sharp = True
@@ -461,43 +561,83 @@ def ensure_weighted_normal(obj):
 # -----------------------------
 # Apply to objects/materials
 # -----------------------------
+_TARGET_TYPES = frozenset({'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'})
+
 def collect_target_objects(context, scope):
-    if scope == 'SELECTED':
-        return [o for o in context.selected_objects if o.type in {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}]
+    src = context.selected_objects if scope == 'SELECTED' else context.scene.objects
+    return [o for o in src if o.type in _TARGET_TYPES]
+
+TOON_PREFIX = "VRM_TOON_"
+
+def _assign_slot_material(obj, index, slot, mat):
+    # DATA-linked slots (the default) are written straight into obj.data.materials
+    if slot.link == 'DATA':
+        obj.data.materials[index] = mat
     else:
-        return [o for o in context.scene.objects if o.type in {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}]
+        slot.material = mat
+
+def collect_toon_material_ptrs():
+    """Pointers of materials already converted (TOON_PREFIX names)."""
+    return {m.as_pointer() for m in bpy.data.materials if m.name.startswith(TOON_PREFIX)}
 
 def convert_object_materials(
     obj, create_new, overwrite, cache_map,
     alpha_blend_method, alpha_clip_threshold,
-    ramp_center, ramp_softness, shadow_value
+    ramp_center, ramp_softness, shadow_value,
+    light_state=None, toon_ptrs=None, colorspace_state=None
 ):
+    """
+    cache_map: old material pointer -> new material (shared across objects)
+    light_state: dict holding the shared LightFactor group under "group"; it is
+      built on the first material that needs it, so runs that convert nothing
+      leave no orphan group. None builds one group per material.
+    toon_ptrs: pointers of already converted materials; new ones are added
+    colorspace_state: see set_colorspace()
+    """
+    mslots = obj.material_slots
+    slots = len(mslots)
+    if slots == 0:
+        return 0, 0
+    if toon_ptrs is None:
+        toon_ptrs = collect_toon_material_ptrs()
     converted = 0
-    slots = 0
-    for slot in obj.material_slots:
-        slots += 1
+    for i, slot in enumerate(mslots):
         old = slot.material
         if old is None:
             continue
-        if old.name.startswith("VRM_TOON_") and not overwrite:
+        key = old.as_pointer()
+        if key in toon_ptrs and not overwrite:
+            continue
+
+        # Keyed by pointer: cheap int hashing; shared with other objects via execute()
+        if key in cache_map:
+            cached = cache_map[key]
+            # == rather than `is`: bpy hands out a fresh wrapper on each access
+            if old != cached:
+                _assign_slot_material(obj, i, slot, cached)
             continue
 
-        if old in cache_map:
-            slot.material = cache_map[old]
+        if not create_new and not overwrite:
             continue
 
+        # Reached once per source material per run: repeats hit cache_map above
+        base_img, alpha_mode, (em_color, em_strength, em_img) = analyze_material(old)
+
         if create_new:
+            # copy() rather than materials.new(): the node tree is rebuilt anyway, but
+            # custom properties (VRM extension data) and material settings carry over
             new = old.copy()
-            new.name = f"VRM_TOON_{old.name}"
+            new.name = f"{TOON_PREFIX}{old.name}"
+            toon_ptrs.add(new.as_pointer())
         else:
-            if overwrite:
-                new = old
-            else:
-                continue
+            new = old
 
-        base_img = guess_basecolor_image_node(old)
-        alpha_mode = guess_alpha_need(old, base_img)
-        em_color, em_strength, em_img = guess_emission_info(old)
+        light_group = None
+        if light_state is not None:
+            light_group = light_state.get("group")
+            if light_group is None:
+                light_group = build_light_factor_group(ramp_center, ramp_softness, shadow_value)
+                light_state["group"] = light_group
 
         build_eevee_toon_material(
             new,
@@ -510,20 +650,13 @@ def convert_object_materials(
             shadow_value=shadow_value,
             emission_color=em_color,
             emission_strength=em_strength,
-            emission_img_node=em_img
+            emission_img_node=em_img,
+            light_group=light_group,
+            colorspace_state=colorspace_state
         )
 
-        # Ensure exporter-relevant material flags are forced to MASK/CLIP
-        try:
-            new.blend_method = 'CLIP'
-            new.shadow_method = 'CLIP'
-            new.alpha_threshold = alpha_clip_threshold
-            new.use_backface_culling = False
-        except Exception:
-            pass
-
-        cache_map[old] = new
-        slot.material = new
+        cache_map[key] = new
+        _assign_slot_material(obj, i, slot, new)
         converted += 1
 
     return converted, slots
@@ -614,7 +747,13 @@ class VRM_OT_replace_with_eevee_toon(bpy.types.Operator):
             if self.add_weighted_normal:
                 ensure_weighted_normal(obj)
 
-        cache_map = {}
+        # One LightFactor group shared by every material converted in this run,
+        # built by convert_object_materials on first use
+        light_state = {}
+
+        cache_map = {}  # old material pointer -> new material
+        toon_ptrs = collect_toon_material_ptrs()
+        colorspace_state = {}
         total_converted = 0
         total_slots = 0
 
@@ -628,7 +767,10 @@ class VRM_OT_replace_with_eevee_toon(bpy.types.Operator):
                 alpha_clip_threshold=self.alpha_clip_threshold,
                 ramp_center=self.ramp_center,
                 ramp_softness=self.ramp_softness,
-                shadow_value=self.shadow_value
+                shadow_value=self.shadow_value,
+                light_state=light_state,
+                toon_ptrs=toon_ptrs,
+                colorspace_state=colorspace_state
             )
             total_converted += c
             total_slots += s
@@ -695,47 +837,44 @@ classes = (
     VRM_PT_eevee_toon_panel,
 )
 
-def register():
-    for c in classes:
-        bpy.utils.register_class(c)
-
-    bpy.types.Scene.vrm_toon_scope = EnumProperty(
+# Scene-level UI settings mirrored into the operator by the panel
+_SCENE_PROPS = (
+    ("vrm_toon_scope", EnumProperty(
         name="Scope",
         items=[('SELECTED', "Selected objects", ""), ('SCENE', "Whole scene", "")],
         default='SELECTED'
-    )
-    bpy.types.Scene.vrm_toon_create_new = BoolProperty(name="Create new materials", default=True)
-    bpy.types.Scene.vrm_toon_overwrite = BoolProperty(name="Overwrite converted", default=False)
+    )),
+    ("vrm_toon_create_new", BoolProperty(name="Create new materials", default=True)),
+    ("vrm_toon_overwrite", BoolProperty(name="Overwrite converted", default=False)),
 
-    bpy.types.Scene.vrm_toon_alpha_mode = EnumProperty(
+    ("vrm_toon_alpha_mode", EnumProperty(
         name="Transparency Mode",
         items=[('CLIP', "Alpha Clip (GLB cutout)", ""), ('HASHED', "Alpha Hashed", ""), ('BLEND', "Alpha Blend", "")],
         default='CLIP'
-    )
-    bpy.types.Scene.vrm_toon_alpha_clip_threshold = FloatProperty(name="Clip Threshold", default=0.5, min=0.0, max=1.0)
+    )),
+    ("vrm_toon_alpha_clip_threshold", FloatProperty(name="Clip Threshold", default=0.5, min=0.0, max=1.0)),
 
-    bpy.types.Scene.vrm_toon_ramp_center = FloatProperty(name="Ramp Center", default=0.62, min=0.0, max=1.0)
-    bpy.types.Scene.vrm_toon_ramp_softness = FloatProperty(
+    ("vrm_toon_ramp_center", FloatProperty(name="Ramp Center", default=0.62, min=0.0, max=1.0)),
+    ("vrm_toon_ramp_softness", FloatProperty(
         name="Ramp Softness", default=0.02, min=0.0, max=0.2
-    )
-    bpy.types.Scene.vrm_toon_shadow_value = FloatProperty(name="Shadow Brightness", default=0.25, min=0.0, max=1.0)
+    )),
+    ("vrm_toon_shadow_value", FloatProperty(name="Shadow Brightness", default=0.25, min=0.0, max=1.0)),
+
+    ("vrm_toon_auto_smooth", BoolProperty(name="Shade Smooth target meshes", default=True)),
+    ("vrm_toon_weighted_normal", BoolProperty(name="Add Weighted Normal modifier", default=True)),
+    ("vrm_toon_set_engine", BoolProperty(name="Switch render engine to Eevee", default=True)),
+)
+
+def register():
+    for c in classes:
+        bpy.utils.register_class(c)
 
-    bpy.types.Scene.vrm_toon_auto_smooth = BoolProperty(name="Shade Smooth target meshes", default=True)
-    bpy.types.Scene.vrm_toon_weighted_normal = BoolProperty(name="Add Weighted Normal modifier", default=True)
-    bpy.types.Scene.vrm_toon_set_engine = BoolProperty(name="Switch render engine to Eevee", default=True)
+    for name, prop in _SCENE_PROPS:
+        setattr(bpy.types.Scene, name, prop)
 
 def unregister():
-    del bpy.types.Scene.vrm_toon_scope
-    del bpy.types.Scene.vrm_toon_create_new
-    del bpy.types.Scene.vrm_toon_overwrite
-    del bpy.types.Scene.vrm_toon_alpha_mode
-    del bpy.types.Scene.vrm_toon_alpha_clip_threshold
-    del bpy.types.Scene.vrm_toon_ramp_center
-    del bpy.types.Scene.vrm_toon_ramp_softness
-    del bpy.types.Scene.vrm_toon_shadow_value
-    del bpy.types.Scene.vrm_toon_auto_smooth
-    del bpy.types.Scene.vrm_toon_weighted_normal
-    del bpy.types.Scene.vrm_toon_set_engine
+    for name, _prop in _SCENE_PROPS:
+        delattr(bpy.types.Scene, name)
 
     for c in reversed(classes):
         bpy.utils.unregister_class(c)
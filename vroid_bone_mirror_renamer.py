@@ -9,43 +9,40 @@ bl_info = {
 }
 
 import bpy
+import functools
 import re
+import numpy as np
 from bpy.props import BoolProperty, EnumProperty, FloatProperty
 
 
 # -----------------------------
 # Helpers
 # -----------------------------
-SIDE_SUFFIX_PATTERNS = [
-    (re.compile(r"\.L$"), "L"),
-    (re.compile(r"\.R$"), "R"),
-    (re.compile(r"\.l$"), "L"),
-    (re.compile(r"\.r$"), "R"),
-    (re.compile(r"_L$"), "L"),
-    (re.compile(r"_R$"), "R"),
-    (re.compile(r"-L$"), "L"),
-    (re.compile(r"-R$"), "R"),
-    (re.compile(r" Left$"), "L"),
-    (re.compile(r" Right$"), "R"),
-    (re.compile(r"_Left$"), "L"),
-    (re.compile(r"_Right$"), "R"),
-    (re.compile(r"左$"), "L"),
-    (re.compile(r"右$"), "R"),
-]
-
-MID_LR_PATTERNS = [
+# recognized end suffixes; at most one of them can end a given name
+END_L = (".L", ".l", "_L", "-L", " Left", "_Left", "左")
+END_R = (".R", ".r", "_R", "-R", " Right", "_Right", "右")
+
+# mid-name markers in priority order; the last occurrence of the first marker
+# found is cut out (same result as the old greedy "(.*)X(.*)" fullmatch)
+MID_LR_TOKENS = (
     # typical VRoid/VRM style: J_Bip_L_UpperArm / J_Bip_R_UpperArm
-    (re.compile(r"(.*)_L_(.*)"), "L"),
-    (re.compile(r"(.*)_R_(.*)"), "R"),
+    ("_L_", "L"),
+    ("_R_", "R"),
     # sometimes: xxx.Left.xxx, xxx.Right.xxx
-    (re.compile(r"(.*)\.Left\.(.*)"), "L"),
-    (re.compile(r"(.*)\.Right\.(.*)"), "R"),
-    (re.compile(r"(.*)_Left_(.*)"), "L"),
-    (re.compile(r"(.*)_Right_(.*)"), "R"),
+    (".Left.", "L"),
+    (".Right.", "R"),
+    ("_Left_", "L"),
+    ("_Right_", "R"),
     # Japanese in middle
-    (re.compile(r"(.*)左(.*)"), "L"),
-    (re.compile(r"(.*)右(.*)"), "R"),
-]
+    ("左", "L"),
+    ("右", "R"),
+)
+
+
+@functools.cache
+def _token_subs():
+    # explicit "left"/"right" tokens, any case; compiled on first use, not at import
+    return re.compile(r"left", re.IGNORECASE), re.compile(r"right", re.IGNORECASE)
 
 
 def get_suffix_style(style_key: str, side: str) -> str:
@@ -60,55 +57,96 @@ def get_suffix_style(style_key: str, side: str) -> str:
     return f".{side}"
 
 
-def strip_existing_side_suffix(name: str) -> str:
-    for rx, _side in SIDE_SUFFIX_PATTERNS:
-        if rx.search(name):
-            return rx.sub("", name)
-    return name
+def _scrub(base: str) -> str:
+    # tidy a base after a token was cut out of it ("Hand__" -> "Hand");
+    # two C-level str calls are faster than any per-character Python loop
+    return base.replace("__", "_").strip(" _.-")
 
 
-def detect_side_from_name(name: str):
-    # returns ("L"/"R"/None, base_name)
-    for rx, side in SIDE_SUFFIX_PATTERNS:
-        if rx.search(name):
-            base = rx.sub("", name)
-            return side, base
+def detect_side_from_suffix(name: str):
+    # returns ("L"/"R"/None, base_name), end suffix only
+    if name.endswith(END_L):
+        side, suffixes = "L", END_L
+    elif name.endswith(END_R):
+        side, suffixes = "R", END_R
+    else:
+        return None, name
+    for suffix in suffixes:
+        if name.endswith(suffix):
+            return side, name[:-len(suffix)]
+
+
+def strip_existing_side_suffix(name: str) -> str:
+    return detect_side_from_suffix(name)[1]
+
 
+@functools.lru_cache(maxsize=4096)
+def detect_side_from_mid(name: str):
+    # returns ("L"/"R"/None, base_name), mid-name markers and tokens only
     # detect mid patterns and rebuild base
-    for rx, side in MID_LR_PATTERNS:
-        m = rx.fullmatch(name)
-        if m:
-            base = (m.group(1) + "_" + m.group(2)).strip("_")
+    for token, side in MID_LR_TOKENS:
+        i = name.rfind(token)
+        if i >= 0:
+            base = (name[:i] + "_" + name[i + len(token):]).strip("_")
             return side, base
 
     # also: explicit tokens
+    # "left"/"right" need an l or r; many center bones (Hips, Spine, Head) have neither
+    if "l" not in name and "L" not in name and "r" not in name and "R" not in name:
+        return None, name
     lowered = name.lower()
-    if "left" in lowered and "right" not in lowered:
-        base = re.sub("(?i)left", "", name).replace("__", "_").strip("_ .-")
+    has_left = "left" in lowered
+    has_right = "right" in lowered
+    if has_left and not has_right:
+        base = _scrub(_token_subs()[0].sub("", name))
         return "L", base
-    if "right" in lowered and "left" not in lowered:
-        base = re.sub("(?i)right", "", name).replace("__", "_").strip("_ .-")
+    if has_right and not has_left:
+        base = _scrub(_token_subs()[1].sub("", name))
         return "R", base
 
     return None, name
 
 
+@functools.lru_cache(maxsize=4096)
+def detect_side_from_name(name: str):
+    # returns ("L"/"R"/None, base_name)
+    side, base = detect_side_from_suffix(name)
+    if side:
+        return side, base
+    return detect_side_from_mid(name)
+
+
 def bone_center_x_in_armature_space(bone):
     # bone.head_local / tail_local are in armature space
     x = (bone.head_local.x + bone.tail_local.x) * 0.5
     return x
 
 
-def make_unique_name(target_names_set, desired):
+def bone_center_x_array(bones):
+    # same as bone_center_x_in_armature_space for a whole bone collection, read
+    # with one foreach_get per vector instead of two RNA lookups per bone
+    n = len(bones)
+    heads = np.empty(n * 3, dtype=np.float32)
+    tails = np.empty(n * 3, dtype=np.float32)
+    bones.foreach_get("head_local", heads)
+    bones.foreach_get("tail_local", tails)
+    # add in double precision like the per-bone path; plain floats for the loop
+    return ((heads[0::3].astype(np.float64) + tails[0::3]) * 0.5).tolist()
+
+
+def make_unique_name(target_names_set, desired, next_idx=None):
     if desired not in target_names_set:
         target_names_set.add(desired)
         return desired
-    # add numeric suffix
-    i = 1
+    # add numeric suffix; next_idx remembers where probing for each base
+    # left off, so repeated collisions don't rescan from .001
+    i = next_idx.get(desired, 1) if next_idx is not None else 1
     while True:
-        candidate = f"{desired}.{i:03d}"
+        candidate = "%s.%03d" % (desired, i)
         if candidate not in target_names_set:
             target_names_set.add(candidate)
+            if next_idx is not None:
+                next_idx[desired] = i + 1
             return candidate
         i += 1
 
@@ -163,6 +201,13 @@ class VROID_OT_bone_mirror_renamer(bpy.types.Operator):
         description="If a bone already ends with a recognized L/R suffix, keep it",
     )
 
+    def invoke(self, context, event):
+        # Bind scene props -> operator props once per button press (so UI changes apply)
+        scene = context.scene
+        for op_attr, scene_attr in _PROP_MAP:
+            setattr(self, op_attr, getattr(scene, scene_attr))
+        return self.execute(context)
+
     def execute(self, context):
         obj = context.object
         if not obj or obj.type != "ARMATURE":
@@ -173,52 +218,51 @@ class VROID_OT_bone_mirror_renamer(bpy.types.Operator):
 
         # Determine target bones
         bones = []
-        if self.only_selected and obj.mode == "POSE":
+        center_x = None
+        all_bones = not (self.only_selected and obj.mode == "POSE")
+        if not all_bones:
             bones = [pb.bone for pb in context.selected_pose_bones] if context.selected_pose_bones else []
         else:
             bones = list(arm.bones)
+            if self.use_position_fallback:
+                center_x = bone_center_x_array(arm.bones)
 
         if not bones:
             self.report({"WARNING"}, "No target bones found (select bones in Pose Mode, or disable 'Only selected').")
             return {"CANCELLED"}
 
-        # Build existing names set to keep uniqueness
-        existing_names = set(b.name for b in arm.bones)
-
-        renamed = 0
-        skipped = 0
-
-        # We rename armature bones; must be in Object or Pose mode is fine (Blender allows editing bone names)
-        for b in bones:
-            old = b.name
-
-            # If keeping existing suffix and it already ends with recognizable suffix, skip
-            if self.keep_existing_suffix:
-                already_side, base = detect_side_from_name(old)
-                # If it detected side via *end suffix* (not mid), we consider it "already correct"
-                is_end_suffix = any(rx.search(old) for rx, _ in SIDE_SUFFIX_PATTERNS)
-                if already_side in ("L", "R") and is_end_suffix:
-                    skipped += 1
+        # Resolve options once; operator props are RNA lookups on every access
+        keep_existing = self.keep_existing_suffix
+        detect_mid = detect_side_from_mid if self.convert_mid_lr else None
+        use_position = self.use_position_fallback
+        center_threshold = self.center_threshold
+        suffixes = {side: get_suffix_style(self.suffix_style, side) for side in ("L", "R")}
+
+        # Only end suffixes can give a side here, and those are kept: nothing to rename
+        if keep_existing and not detect_mid and not use_position:
+            self.report({"INFO"}, f"Renamed: 0, Skipped: {len(bones)}")
+            return {"FINISHED"}
+
+        # Read every name across the RNA bridge once; both passes use this list, and
+        # it keeps holding the pre-rename names while pass 2 assigns new ones
+        old_names = [b.name for b in bones]
+
+        # Pass 1: decide a desired name per bone (one detection each, no renaming yet)
+        plan = []
+        for i, old in enumerate(old_names):
+            side, base = detect_side_from_suffix(old)
+            if side:
+                # An end suffix (not mid) is considered "already correct"
+                if keep_existing:
                     continue
-
-            side, base = detect_side_from_name(old)
-
-            # If user disabled mid conversion, ignore mid-only detections
-            if not self.convert_mid_lr:
-                # re-detect only end suffix
-                side2 = None
-                base2 = old
-                for rx, s in SIDE_SUFFIX_PATTERNS:
-                    if rx.search(old):
-                        side2 = s
-                        base2 = rx.sub("", old)
-                        break
-                side, base = side2, base2
+            elif detect_mid:
+                # no end suffix: try mid-name and token detection
+                side, base = detect_mid(old)
 
             # If no side found and fallback enabled, use position
-            if side is None and self.use_position_fallback:
-                x = bone_center_x_in_armature_space(b)
-                if abs(x) <= self.center_threshold:
+            if side is None and use_position:
+                x = center_x[i] if center_x is not None else bone_center_x_in_armature_space(bones[i])
+                if abs(x) <= center_threshold:
                     # center bone: remove side suffix if any weirdness, keep base
                     side = None
                 else:
@@ -228,24 +272,31 @@ class VROID_OT_bone_mirror_renamer(bpy.types.Operator):
             # If still no side, normalize name a bit and continue
             if side is None:
                 # Optionally strip weird trailing markers, but keep original if safe
-                skipped += 1
                 continue
 
             base = base.strip(" _.-")
-            suffix = get_suffix_style(self.suffix_style, side)
-            desired = f"{base}{suffix}"
+            desired = base + suffixes[side]
 
             if desired == old:
-                skipped += 1
                 continue
 
-            # Ensure unique
-            existing_names.discard(old)
-            final = make_unique_name(existing_names, desired)
+            plan.append((i, desired))
 
-            b.name = final
-            renamed += 1
+        # Pass 2: resolve uniqueness in bone order and rename
+        # Build existing names set to keep uniqueness (only if anything is renamed).
+        # Each old name is released just before its own bone is renamed, so an
+        # earlier bone can never take a name a later bone still holds.
+        existing_names = set()
+        if plan:
+            existing_names = set(old_names) if all_bones else {b.name for b in arm.bones}
+        next_idx = {}
+        # We rename armature bones; must be in Object or Pose mode is fine (Blender allows editing bone names)
+        for i, desired in plan:
+            existing_names.discard(old_names[i])
+            bones[i].name = make_unique_name(existing_names, desired, next_idx)
 
+        renamed = len(plan)
+        skipped = len(bones) - renamed
         self.report({"INFO"}, f"Renamed: {renamed}, Skipped: {skipped}")
         return {"FINISHED"}
 
@@ -264,7 +315,7 @@ class VROID_PT_bone_mirror_renamer_panel(bpy.types.Panel):
         layout = self.layout
         col = layout.column(align=True)
 
-        op = col.operator(VROID_OT_bone_mirror_renamer.bl_idname, icon="ARMATURE_DATA")
+        col.operator(VROID_OT_bone_mirror_renamer.bl_idname, icon="ARMATURE_DATA")
 
         col.separator()
         col.label(text="Options")
@@ -275,14 +326,6 @@ class VROID_PT_bone_mirror_renamer_panel(bpy.types.Panel):
         col.prop(context.scene, "vroid_ren_suffix_style")
         col.prop(context.scene, "vroid_ren_keep_existing_suffix")
 
-        # Bind scene props -> operator defaults (so UI changes apply)
-        op.only_selected = context.scene.vroid_ren_only_selected
-        op.convert_mid_lr = context.scene.vroid_ren_convert_mid_lr
-        op.use_position_fallback = context.scene.vroid_ren_use_position_fallback
-        op.center_threshold = context.scene.vroid_ren_center_threshold
-        op.suffix_style = context.scene.vroid_ren_suffix_style
-        op.keep_existing_suffix = context.scene.vroid_ren_keep_existing_suffix
-
 
 # -----------------------------
 # Registration + Scene props
@@ -292,29 +335,27 @@ classes = (
     VROID_PT_bone_mirror_renamer_panel,
 )
 
-def register():
-    for c in classes:
-        bpy.utils.register_class(c)
-
-    bpy.types.Scene.vroid_ren_only_selected = BoolProperty(
+# Scene-level UI settings copied into the operator by invoke
+_SCENE_PROPS = (
+    ("vroid_ren_only_selected", BoolProperty(
         name="Only selected bones",
         default=False,
-    )
-    bpy.types.Scene.vroid_ren_convert_mid_lr = BoolProperty(
+    )),
+    ("vroid_ren_convert_mid_lr", BoolProperty(
         name="Convert mid-name L/R",
         default=True,
-    )
-    bpy.types.Scene.vroid_ren_use_position_fallback = BoolProperty(
+    )),
+    ("vroid_ren_use_position_fallback", BoolProperty(
         name="Use X-position fallback",
         default=True,
-    )
-    bpy.types.Scene.vroid_ren_center_threshold = FloatProperty(
+    )),
+    ("vroid_ren_center_threshold", FloatProperty(
         name="Center threshold",
         default=0.001,
         min=0.0,
         max=1.0,
-    )
-    bpy.types.Scene.vroid_ren_suffix_style = EnumProperty(
+    )),
+    ("vroid_ren_suffix_style", EnumProperty(
         name="Suffix style",
         items=[
             ("DOT", ".L / .R (recommended)", ""),
@@ -322,19 +363,36 @@ def register():
             ("DASH", "-L / -R", ""),
         ],
         default="DOT",
-    )
-    bpy.types.Scene.vroid_ren_keep_existing_suffix = BoolProperty(
+    )),
+    ("vroid_ren_keep_existing_suffix", BoolProperty(
         name="Keep already-correct suffix",
         default=True,
-    )
+    )),
+)
+
+# operator prop <- Scene prop
+_PROP_MAP = (
+    ("only_selected", "vroid_ren_only_selected"),
+    ("convert_mid_lr", "vroid_ren_convert_mid_lr"),
+    ("use_position_fallback", "vroid_ren_use_position_fallback"),
+    ("center_threshold", "vroid_ren_center_threshold"),
+    ("suffix_style", "vroid_ren_suffix_style"),
+    ("keep_existing_suffix", "vroid_ren_keep_existing_suffix"),
+)
+
+def register():
+    for c in classes:
+        bpy.utils.register_class(c)
+
+    for name, prop in _SCENE_PROPS:
+        setattr(bpy.types.Scene, name, prop)
 
 def unregister():
-    del bpy.types.Scene.vroid_ren_only_selected
-    del bpy.types.Scene.vroid_ren_convert_mid_lr
-    del bpy.types.Scene.vroid_ren_use_position_fallback
-    del bpy.types.Scene.vroid_ren_center_threshold
-    del bpy.types.Scene.vroid_ren_suffix_style
-    del bpy.types.Scene.vroid_ren_keep_existing_suffix
+    detect_side_from_mid.cache_clear()
+    detect_side_from_name.cache_clear()
+
+    for name, _prop in _SCENE_PROPS:
+        delattr(bpy.types.Scene, name)
 
     for c in reversed(classes):
         bpy.utils.unregister_class(c)